@@ -17,7 +17,7 @@ provider and requirer classes, as well as in `metadata.yaml`.
 Using charmcraft you can:
 ```shell
 charmcraft fetch-lib charms.dex_auth.v0.dex_oidc_config
-
+```
 
 ## Using the library as requirer
 
@@ -71,7 +71,7 @@ class ProviderCharm(CharmBase):
         self.observe(self.on.some_event, self._some_event_handler)
 
     def _some_event_handler(self, ...):
-        # This will update the relation data bag with the issuer URL 
+        # This will update the relation data bag with the issuer URL
         try:
             self._dex_oidc_config_provider.send_data(issuer_url)
         except DexOidcConfigRelationError as error:
@@ -93,15 +93,15 @@ class ProviderCharm(CharmBase):
 ## Relation data
 
 The data shared by this library is:
-* issuer-url: the canonical URL for the issuer, OIDC cliets use this to refer to Dex
+* issuer-url: the canonical URL for the issuer, OIDC clients use this to refer to Dex
 """
 import logging
-from typing import List, Optional, Union
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
 
 from ops.charm import CharmBase, RelationEvent
 from ops.framework import BoundEvent, EventSource, Object, ObjectEvents
 from ops.model import Relation
-from pydantic import BaseModel
 
 # The unique Charmhub library identifier, never change it
 LIBID = "eb5a471989b246e4977399bc8cf9ae6f"
@@ -111,7 +111,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 2
 
 # Default relation and interface names. If changed, consistency must be kept
 # across the provider and requirer.
@@ -154,7 +154,23 @@ class DexOidcConfigEvents(ObjectEvents):
     updated = EventSource(DexOidcConfigUpdatedEvent)
 
 
-class DexOidcConfigObject(BaseModel):
+def _unique_events(refresh_events: Union[BoundEvent, List[BoundEvent]]) -> List[BoundEvent]:
+    """Return refresh_events as a list without duplicated events.
+
+    Args:
+        refresh_events: a BoundEvent or a list of BoundEvents, possibly with duplicates.
+    """
+    if isinstance(refresh_events, BoundEvent):
+        return [refresh_events]
+
+    unique_events = {}
+    for evt in refresh_events:
+        unique_events.setdefault((evt.emitter.handle.path, evt.event_kind), evt)
+    return list(unique_events.values())
+
+
+@dataclass(frozen=True)
+class DexOidcConfigObject:
     """Representation of a Dex OIDC config object.
 
     Args:
@@ -172,8 +188,8 @@ class DexOidcConfigRequirer(Object):
 
     Args:
         charm (CharmBase): the provider application
-        refresh_events: (list, optional): list of BoundEvents that this manager should handle.
-                       Use this to update the data sent on this relation on demand.
+        refresh_events: (list, optional): BoundEvent or list of BoundEvents that this manager
+                       should handle. Use this to update the data sent on this relation on demand.
         relation_name (str, optional): the name of the relation
 
     Attributes:
@@ -186,13 +202,15 @@ class DexOidcConfigRequirer(Object):
     def __init__(
         self,
         charm: CharmBase,
-        refresh_events: Optional[List[BoundEvent]] = None,
+        refresh_events: Optional[Union[BoundEvent, List[BoundEvent]]] = None,
         relation_name: Optional[str] = DEFAULT_RELATION_NAME,
     ):
         super().__init__(charm, relation_name)
         self._charm = charm
         self._relation_name = relation_name
         self._requirer_wrapper = DexOidcConfigRequirerWrapper(self._charm, self._relation_name)
+        # (relation id, issuer-url) of the data the last updated event was emitted for
+        self._last_emitted: Optional[Tuple[int, Optional[str]]] = None
 
         self.framework.observe(
             self._charm.on[self._relation_name].relation_changed, self._on_relation_changed
@@ -203,7 +221,7 @@ class DexOidcConfigRequirer(Object):
         )
 
         if refresh_events:
-            for evt in refresh_events:
+            for evt in _unique_events(refresh_events):
                 self.framework.observe(evt, self._on_relation_changed)
 
     def get_data(self) -> DexOidcConfigObject:
@@ -211,11 +229,21 @@ class DexOidcConfigRequirer(Object):
         return self._requirer_wrapper.get_data()
 
     def _on_relation_changed(self, event: BoundEvent) -> None:
-        """Handle relation-changed event for this relation."""
-        self.on.updated.emit(event.relation)
+        """Handle relation-changed event for this relation.
+
+        The updated event is only emitted if the data changed since the last emission,
+        so several refresh events firing for the same data result in a single emission.
+        """
+        relation = event.relation
+        emitted_data = (relation.id, relation.data[relation.app].get("issuer-url"))
+        if emitted_data == self._last_emitted:
+            return
+        self._last_emitted = emitted_data
+        self.on.updated.emit(relation)
 
     def _on_relation_broken(self, event: BoundEvent) -> None:
         """Handle relation-broken event for this relation."""
+        self._last_emitted = None
         self.on.updated.emit(event.relation)
 
 
@@ -233,10 +261,12 @@ class DexOidcConfigRequirerWrapper(Object):
     def __init__(self, charm, relation_name: Optional[str] = DEFAULT_RELATION_NAME):
         super().__init__(charm, relation_name)
         self.relation_name = relation_name
+        # (relation id, issuer-url, object) of the last object returned by get_data
+        self._cache: Optional[Tuple[int, str, DexOidcConfigObject]] = None
 
     @staticmethod
     def _validate_relation(relation: Optional[Relation]) -> None:
-        """Series of checks for the relation and relation data.
+        """Check the relation exists.
 
         Args:
             relation (optional, Relation): the relation object to run the checks on.
@@ -244,24 +274,12 @@ class DexOidcConfigRequirerWrapper(Object):
               can either return a Relation object or None.
 
         Raises:
-            DexOidcConfigRelationDataMissingError if data is missing or incomplete
             DexOidcConfigRelationMissingError: if there is no related application
         """
         # Raise if there is no related application
         if not relation:
             raise DexOidcConfigRelationMissingError()
 
-        # Extract remote app information from relation
-        remote_app = relation.app
-        # Get relation data from remote app
-        relation_data = relation.data[remote_app]
-
-        # Raise if there is no data found in the relation data bag
-        if not relation_data:
-            raise DexOidcConfigRelationDataMissingError(
-                f"No data found in relation {relation.name} data bag."
-            )
-
     def get_data(self) -> DexOidcConfigObject:
         """Return a DexOidcConfigObject containing Dex's OIDC configuration.
 
@@ -279,7 +297,23 @@ class DexOidcConfigRequirerWrapper(Object):
         # Get relation data from remote app
         relation_data = relation.data[relation.app]
 
-        return DexOidcConfigObject(issuer_url=relation_data["issuer-url"])
+        # Raise if any required attribute is not found in the relation data bag
+        missing_attributes = [attr for attr in REQUIRED_ATTRIBUTES if not relation_data.get(attr)]
+        if missing_attributes:
+            raise DexOidcConfigRelationDataMissingError(
+                f"Missing {', '.join(missing_attributes)} in relation {relation.name} data bag."
+            )
+        issuer_url = relation_data["issuer-url"]
+
+        # Reuse the last object if the relation data has not changed since
+        if self._cache and self._cache[:2] == (relation.id, issuer_url):
+            return self._cache[2]
+
+        # The data bag is written by the paired provider charm, so it is trusted
+        # and no further validation is done when building the object
+        dex_oidc_config = DexOidcConfigObject(issuer_url=issuer_url)
+        self._cache = (relation.id, issuer_url, dex_oidc_config)
+        return dex_oidc_config
 
 
 class DexOidcConfigProvider(Object):
@@ -290,8 +324,8 @@ class DexOidcConfigProvider(Object):
     Args:
         charm (CharmBase): the provider application
         issuer_url (str): This is the canonical URL that OIDC clients MUST use to refer to dex.
-        refresh_events: (list, optional): list of BoundEvents that this manager should handle.  Use this to update
-                       the data sent on this relation on demand.
+        refresh_events: (list, optional): BoundEvent or list of BoundEvents that this manager
+                       should handle. Use this to update the data sent on this relation on demand.
         relation_name (str, optional): the name of the relation
 
     Attributes:
@@ -303,7 +337,7 @@ class DexOidcConfigProvider(Object):
         self,
         charm: CharmBase,
         issuer_url: str,
-        refresh_events: Optional[List[BoundEvent]] = None,
+        refresh_events: Optional[Union[BoundEvent, List[BoundEvent]]] = None,
         relation_name: Optional[str] = DEFAULT_RELATION_NAME,
     ):
         super().__init__(charm, relation_name)
@@ -317,7 +351,7 @@ class DexOidcConfigProvider(Object):
         self.framework.observe(self.charm.on[self.relation_name].relation_created, self._send_data)
 
         if refresh_events:
-            for evt in refresh_events:
+            for evt in _unique_events(refresh_events):
                 self.framework.observe(evt, self._send_data)
 
     def _send_data(self, _) -> None:
@@ -362,12 +396,17 @@ class DexOidcConfigProviderWrapper(Object):
             return
 
         # Update the relation data bag with Dex's OIDC configuration
+        # ops caches this list for the whole hook, so relation-ids is only called once
         relations = self.charm.model.relations[self.relation_name]
 
-        # Update relation data
+        app = self.charm.app
+        data = {
+            "issuer-url": issuer_url,
+        }
+
+        # Update relation data, skipping relations that already have the same value
         for relation in relations:
-            relation.data[self.charm.app].update(
-                {
-                    "issuer-url": issuer_url,
-                }
-            )
+            relation_data = relation.data[app]
+            if relation_data.get("issuer-url") == issuer_url:
+                continue
+            relation_data.update(data)
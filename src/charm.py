@@ -3,8 +3,9 @@
 # See LICENSE file for licensing details.
 
 import logging
-from random import choices
-from string import ascii_letters
+from functools import cached_property
+from hashlib import blake2b, sha256
+from secrets import token_urlsafe
 from uuid import uuid4
 
 import bcrypt
@@ -23,18 +24,38 @@ from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus, WaitingSta
 from ops.pebble import Layer
 from serialized_data_interface import NoCompatibleVersions, NoVersionsListed, get_interface
 
+# Use the LibYAML bindings when available, they are much faster than the pure Python ones
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper, SafeLoader
+
 METRICS_PATH = "/metrics"
 METRICS_PORT = "5558"
+BCRYPT_COST_RANGE = range(4, 16)
 
 
 class Operator(CharmBase):
     state = StoredState()
 
+    # Events handled by main
+    _OBSERVED_EVENTS = (
+        "install",
+        "leader_elected",
+        "upgrade_charm",
+        "config_changed",
+        "oidc_client_relation_changed",
+        "ingress_relation_changed",
+        "dex_pebble_ready",
+    )
+
     def __init__(self, *args):
         super().__init__(*args)
 
         self.logger: logging.Logger = logging.getLogger(__name__)
         self._namespace = self.model.name
+        self.state.set_default(password_hash_key="", password_hash="", config_hash="")
 
         # Patch the service to correctly expose the ports to be used
         dex_port = ServicePort(int(self.model.config["port"]), name="dex")
@@ -69,20 +90,16 @@ class Operator(CharmBase):
         self._entrypoint = "/usr/local/bin/docker-entrypoint"
         self._dex_config_path = "/etc/dex/config.docker.yaml"
 
-        for event in [
-            self.on.install,
-            self.on.leader_elected,
-            self.on.upgrade_charm,
-            self.on.config_changed,
-            self.on.oidc_client_relation_changed,
-            self.on.ingress_relation_changed,
-            self.on.dex_pebble_ready,
-        ]:
-            self.framework.observe(event, self.main)
-
-    @property
+        for event_name in self._OBSERVED_EVENTS:
+            self.framework.observe(getattr(self.on, event_name), self.main)
+
+    @cached_property
     def _dex_auth_layer(self) -> Layer:
-        """Returns a pre-configured Pebble layer."""
+        """Returns a pre-configured Pebble layer.
+
+        The layer only depends on values that do not change during the charm's lifetime,
+        so it is built once and cached.
+        """
 
         layer_config = {
             "summary": "dex-auth-operator layer",
@@ -101,9 +118,12 @@ class Operator(CharmBase):
         }
         return Layer(layer_config)
 
-    @property
+    @cached_property
     def _issuer_url(self) -> str:
-        """Return issuer-url value if config option exists; otherwise default Dex's endpoint."""
+        """Return issuer-url value if config option exists; otherwise default Dex's endpoint.
+
+        The config cannot change during a dispatch, so the value is computed once.
+        """
         if issuer_url := self.model.config["issuer-url"]:
             return issuer_url
         # TODO: remove this after the release of dex-auth 2.39
@@ -131,31 +151,82 @@ class Operator(CharmBase):
         # so the service is (re)started.
         dex_auth_config = self._generate_dex_auth_config()
 
-        # Get current layer
+        # Get current layer. This is read from Pebble rather than tracked in the stored
+        # state, since the plan is lost whenever the workload container restarts
         current_layer = self._container.get_plan()
         # Create a new config layer
         new_layer = self._dex_auth_layer
-        if current_layer.services != new_layer.services:
+        layer_changed = current_layer.services != new_layer.services
+        if layer_changed:
             self.unit.status = MaintenanceStatus("Applying new pebble layer")
             self._container.add_layer(self._container_name, new_layer, combine=True)
             self.logger.info("Pebble plan updated with new configuration")
 
-        # Get current dex config
-        current_config = self._container.pull(self._dex_config_path).read()
-        if current_config != dex_auth_config:
-            self._container.push(self._dex_config_path, dex_auth_config, make_dirs=True)
+        # Compare against the hash of the last pushed dex config instead of pulling it.
+        # The layer is also added whenever the workload container is new, so push in
+        # that case too, as the new container will not have the config file
+        dex_auth_config_bytes = dex_auth_config.encode("utf-8")
+        config_hash = blake2b(dex_auth_config_bytes, digest_size=16).hexdigest()
+        config_changed = self.state.config_hash != config_hash
+        if layer_changed or config_changed:
+            self._container.push(self._dex_config_path, dex_auth_config_bytes, make_dirs=True)
+            self.state.config_hash = config_hash
             self.logger.info("Updated dex config")
 
-        # Using restart due to https://github.com/canonical/dex-auth-operator/issues/63
-        self._container.restart(self._container_name)
+        if config_changed:
+            # Using restart due to https://github.com/canonical/dex-auth-operator/issues/63
+            # Only restart when the config changed, restarting drops Dex's connections
+            self._container.restart(self._container_name)
+        else:
+            # replan only starts dex if it is not running, or restarts it if the layer changed
+            self._container.replan()
+
+    def _hash_password(self, password: bytes) -> str:
+        """Returns the bcrypt hash of the password, reusing the stored one if unchanged.
+
+        bcrypt is slow by design, so the hash is kept in the stored state together with
+        a digest of the password and salt it was computed from.
+        """
+        password_hash_key = sha256(password + self.state.salt).hexdigest()
+        if self.state.password_hash_key != password_hash_key:
+            self.state.password_hash = bcrypt.hashpw(password, self.state.salt).decode("utf-8")
+            self.state.password_hash_key = password_hash_key
+        return self.state.password_hash
 
     def ensure_state(self):
-        self.state.set_default(
-            username="admin",
-            password="".join(choices(ascii_letters, k=30)),
-            salt=bcrypt.gensalt(),
-            user_id=str(uuid4()),
-        )
+        # set_default evaluates its arguments on every call, so avoid generating
+        # a new password and user id when they are already stored
+        if not hasattr(self.state, "user_id"):
+            self.state.set_default(
+                username="admin",
+                password=token_urlsafe(22),
+                user_id=str(uuid4()),
+            )
+
+    def _ensure_salt(self) -> None:
+        """Generates the static password salt, or a new one when bcrypt-cost changed.
+
+        Raises:
+            ErrorWithStatus: when bcrypt-cost is out of range.
+        """
+        bcrypt_cost = self.model.config["bcrypt-cost"]
+        if bcrypt_cost not in BCRYPT_COST_RANGE:
+            raise ErrorWithStatus(
+                f"bcrypt-cost must be between {BCRYPT_COST_RANGE[0]} and {BCRYPT_COST_RANGE[-1]}",
+                BlockedStatus,
+            )
+
+        if not hasattr(self.state, "salt"):
+            self.state.salt = bcrypt.gensalt(rounds=bcrypt_cost)
+            self.state.bcrypt_cost = bcrypt_cost
+        # Salts generated before the bcrypt-cost option existed keep their cost
+        # until the option is changed
+        elif not hasattr(self.state, "bcrypt_cost"):
+            self.state.bcrypt_cost = bcrypt_cost
+        # The cost is part of the salt, e.g. $2b$10$..., so changing it needs a new salt
+        elif self.state.bcrypt_cost != bcrypt_cost:
+            self.state.salt = bcrypt.gensalt(rounds=bcrypt_cost)
+            self.state.bcrypt_cost = bcrypt_cost
 
     def handle_ingress(self):
         interface = self._get_interface("ingress")
@@ -210,21 +281,23 @@ class Operator(CharmBase):
         Raises:
             CheckFailedError: when static login is disabled and no connectors are configured.
         """
-        # Get OIDC client info
+        # Get OIDC client info, sorted so the rendered config does not depend on
+        # the order the relations are returned in
         oidc = self._get_interface("oidc-client")
         if oidc:
-            oidc_client_info = list(oidc.get_data().values())
+            oidc_client_info = sorted(
+                oidc.get_data().values(), key=lambda client: client.get("id", "")
+            )
         else:
             oidc_client_info = []
 
         # Load config values as convenient variables
-        connectors = yaml.safe_load(self.model.config["connectors"])
-        port = self.model.config["port"]
+        charm_config = self.model.config
+        connectors = yaml.load(charm_config["connectors"], Loader=SafeLoader)
+        port = charm_config["port"]
 
-        enable_password_db = self.model.config["enable-password-db"]
-        static_config = {
-            "staticPasswords": [],
-        }
+        enable_password_db = charm_config["enable-password-db"]
+        static_passwords = []
 
         # The dex-auth service cannot be started correctly when the static
         # login is disabled, but no connector configuration is provided.
@@ -235,20 +308,18 @@ class Operator(CharmBase):
             )
 
         if enable_password_db:
-            static_username = self.model.config["static-username"] or self.state.username
-            static_password = self.model.config["static-password"] or self.state.password
-            static_password = static_password.encode("utf-8")
-            hashed = bcrypt.hashpw(static_password, self.state.salt).decode("utf-8")
-            static_config = {
-                "staticPasswords": [
-                    {
-                        "email": static_username,
-                        "hash": hashed,
-                        "username": static_username,
-                        "userID": self.state.user_id,
-                    }
-                ],
-            }
+            static_username = charm_config["static-username"] or self.state.username
+            static_password = charm_config["static-password"] or self.state.password
+            self._ensure_salt()
+            hashed = self._hash_password(static_password.encode("utf-8"))
+            static_passwords = [
+                {
+                    "email": static_username,
+                    "hash": hashed,
+                    "username": static_username,
+                    "userID": self.state.user_id,
+                }
+            ]
 
         config = yaml.dump(
             {
@@ -261,8 +332,9 @@ class Operator(CharmBase):
                 "staticClients": oidc_client_info,
                 "connectors": connectors,
                 "enablePasswordDB": enable_password_db,
-                **static_config,
-            }
+                "staticPasswords": static_passwords,
+            },
+            Dumper=SafeDumper,
         )
 
         return config
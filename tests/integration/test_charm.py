@@ -1,9 +1,9 @@
 # Copyright 2023 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import asyncio
 import logging
 from pathlib import Path
-from time import sleep
 
 import lightkube
 import pytest
@@ -24,9 +24,15 @@ from selenium.common.exceptions import JavascriptException, WebDriverException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from tenacity import Retrying, stop_after_attempt, stop_after_delay, wait_exponential
+from tenacity import Retrying, retry_if_exception_type, stop_after_delay, wait_exponential
 
-METADATA = yaml.safe_load(Path("./metadata.yaml").read_text())
+# Use the LibYAML bindings when available, they are much faster than the pure Python ones
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+METADATA = yaml.load(Path("./metadata.yaml").read_text(), Loader=SafeLoader)
 CHARM_ROOT = "."
 DEX_AUTH = "dex-auth"
 DEX_AUTH_APP_NAME = METADATA["name"]
@@ -63,8 +69,14 @@ KUBEFLOW_DASHBOARD_TRUST = True
 log = logging.getLogger(__name__)
 
 
+@pytest.fixture(scope="module")
+def lightkube_client() -> lightkube.Client:
+    """Returns a lightkube client shared by the tests in this module."""
+    return lightkube.Client()
+
+
 @pytest.mark.abort_on_fail
-async def test_build_and_deploy(ops_test):
+async def test_build_and_deploy(ops_test: OpsTest, lightkube_client: lightkube.Client):
     my_charm = await ops_test.build_charm(".")
     dex_image_path = METADATA["resources"]["oci-image"]["upstream-source"]
     await ops_test.model.deploy(
@@ -77,88 +89,73 @@ async def test_build_and_deploy(ops_test):
         apps=[DEX_AUTH_APP_NAME], status="active", raise_on_blocked=True, timeout=600
     )
 
+    # Pod readiness is driven by its probes and can lag the unit becoming active
+    def statefulset_ready() -> bool:
+        statefulset = lightkube_client.get(
+            StatefulSet, DEX_AUTH_APP_NAME, namespace=ops_test.model_name
+        )
+        return statefulset.status.readyReplicas == statefulset.spec.replicas
+
+    await ops_test.model.block_until(statefulset_ready, timeout=60, wait_period=2)
+
     # Deploying grafana-agent-k8s and add all relations
     await deploy_and_assert_grafana_agent(
         ops_test.model, DEX_AUTH_APP_NAME, metrics=True, dashboard=True, logging=True
     )
 
 
-@pytest.mark.abort_on_fail
-def test_statefulset_readiness(ops_test: OpsTest):
-    lightkube_client = lightkube.Client()
-    for attempt in retry_for_5_attempts:
-        log.info(
-            f"Waiting for StatefulSet replica(s) to be ready"
-            f"(attempt {attempt.retry_state.attempt_number})"
-        )
-        with attempt:
-            statefulset = lightkube_client.get(
-                StatefulSet, DEX_AUTH_APP_NAME, namespace=ops_test.model_name
-            )
-
-            expected_replicas = statefulset.spec.replicas
-            ready_replicas = statefulset.status.readyReplicas
-
-            assert expected_replicas == ready_replicas
-
-
 @pytest.mark.abort_on_fail
 async def test_relations(ops_test: OpsTest):
-    await ops_test.model.deploy(
-        entity_url=ISTIO_PILOT,
-        channel=ISTIO_OPERATORS_CHANNEL,
-        config=ISTIO_PILOT_CONFIG,
-        trust=ISTIO_PILOT_TRUST,
-    )
-
-    await ops_test.model.deploy(
-        entity_url=ISTIO_GATEWAY,
-        application_name=ISTIO_GATEWAY_APP_NAME,
-        channel=ISTIO_OPERATORS_CHANNEL,
-        config=ISTIO_GATEWAY_CONFIG,
-        trust=ISTIO_GATEWAY_TRUST,
-    )
-    await ops_test.model.add_relation(
-        ISTIO_PILOT,
-        ISTIO_GATEWAY_APP_NAME,
-    )
-
-    await ops_test.model.wait_for_idle(
-        [ISTIO_PILOT, ISTIO_GATEWAY_APP_NAME],
-        raise_on_blocked=False,
-        status="active",
-        timeout=90 * 10,
-    )
-
-    await ops_test.model.deploy(
-        OIDC_GATEKEEPER,
-        channel=OIDC_GATEKEEPER_CHANNEL,
-        config=OIDC_GATEKEEPER_CONFIG,
-    )
-    await ops_test.model.add_relation(
-        f"{OIDC_GATEKEEPER}:dex-oidc-config", f"{DEX_AUTH_APP_NAME}:dex-oidc-config"
-    )
-    await ops_test.model.add_relation(
-        f"{OIDC_GATEKEEPER}:oidc-client", f"{DEX_AUTH_APP_NAME}:oidc-client"
-    )
-    await ops_test.model.add_relation(f"{ISTIO_PILOT}:ingress", f"{DEX_AUTH_APP_NAME}:ingress")
-    await ops_test.model.add_relation(
-        f"{ISTIO_PILOT}:ingress-auth",
-        f"{OIDC_GATEKEEPER}:ingress-auth",
-    )
-
-    await ops_test.model.deploy(
-        KUBEFLOW_PROFILES,
-        channel=KUBEFLOW_PROFILES_CHANNEL,
-        trust=KUBEFLOW_PROFILES_TRUST,
+    # The deployments are independent, so run them concurrently
+    await asyncio.gather(
+        ops_test.model.deploy(
+            entity_url=ISTIO_PILOT,
+            channel=ISTIO_OPERATORS_CHANNEL,
+            config=ISTIO_PILOT_CONFIG,
+            trust=ISTIO_PILOT_TRUST,
+        ),
+        ops_test.model.deploy(
+            entity_url=ISTIO_GATEWAY,
+            application_name=ISTIO_GATEWAY_APP_NAME,
+            channel=ISTIO_OPERATORS_CHANNEL,
+            config=ISTIO_GATEWAY_CONFIG,
+            trust=ISTIO_GATEWAY_TRUST,
+        ),
+        ops_test.model.deploy(
+            OIDC_GATEKEEPER,
+            channel=OIDC_GATEKEEPER_CHANNEL,
+            config=OIDC_GATEKEEPER_CONFIG,
+        ),
+        ops_test.model.deploy(
+            KUBEFLOW_PROFILES,
+            channel=KUBEFLOW_PROFILES_CHANNEL,
+            trust=KUBEFLOW_PROFILES_TRUST,
+        ),
+        ops_test.model.deploy(
+            KUBEFLOW_DASHBOARD,
+            channel=KUBEFLOW_DASHBOARD_CHANNEL,
+            trust=KUBEFLOW_DASHBOARD_TRUST,
+        ),
     )
-    await ops_test.model.deploy(
-        KUBEFLOW_DASHBOARD,
-        channel=KUBEFLOW_DASHBOARD_CHANNEL,
-        trust=KUBEFLOW_DASHBOARD_TRUST,
+    await asyncio.gather(
+        ops_test.model.add_relation(
+            ISTIO_PILOT,
+            ISTIO_GATEWAY_APP_NAME,
+        ),
+        ops_test.model.add_relation(
+            f"{OIDC_GATEKEEPER}:dex-oidc-config", f"{DEX_AUTH_APP_NAME}:dex-oidc-config"
+        ),
+        ops_test.model.add_relation(
+            f"{OIDC_GATEKEEPER}:oidc-client", f"{DEX_AUTH_APP_NAME}:oidc-client"
+        ),
+        ops_test.model.add_relation(f"{ISTIO_PILOT}:ingress", f"{DEX_AUTH_APP_NAME}:ingress"),
+        ops_test.model.add_relation(
+            f"{ISTIO_PILOT}:ingress-auth",
+            f"{OIDC_GATEKEEPER}:ingress-auth",
+        ),
+        ops_test.model.add_relation(KUBEFLOW_PROFILES, KUBEFLOW_DASHBOARD),
+        ops_test.model.add_relation(f"{ISTIO_PILOT}:ingress", f"{KUBEFLOW_DASHBOARD}:ingress"),
     )
-    await ops_test.model.add_relation(KUBEFLOW_PROFILES, KUBEFLOW_DASHBOARD)
-    await ops_test.model.add_relation(f"{ISTIO_PILOT}:ingress", f"{KUBEFLOW_DASHBOARD}:ingress")
 
     await ops_test.model.wait_for_idle(
         apps=[
@@ -172,12 +169,11 @@ async def test_relations(ops_test: OpsTest):
         status="active",
         raise_on_blocked=False,
         raise_on_error=True,
-        timeout=600,
+        timeout=90 * 10,
     )
 
 
-def get_public_url(service_name: str, namespace: str):
-    lightkube_client = lightkube.Client()
+def get_public_url(lightkube_client: lightkube.Client, service_name: str, namespace: str):
     gateway_svc = lightkube_client.get(Service, service_name, namespace=namespace)
 
     endpoint = gateway_svc.status.loadBalancer.ingress[0].ip
@@ -186,8 +182,9 @@ def get_public_url(service_name: str, namespace: str):
 
 
 @pytest.fixture()
-async def driver(ops_test: OpsTest):
+async def driver(ops_test: OpsTest, lightkube_client: lightkube.Client):
     public_url = get_public_url(
+        lightkube_client,
         service_name="istio-ingressgateway-workload",
         namespace=ops_test.model_name,
     )
@@ -203,18 +200,23 @@ async def driver(ops_test: OpsTest):
 
     options = Options()
     options.headless = True
+    # Run Chrome without the sandbox, /dev/shm, GPU and extensions, none of which
+    # are needed for a headless browser in CI and all of which slow down its start
+    for argument in (
+        "--no-sandbox",
+        "--disable-dev-shm-usage",
+        "--disable-gpu",
+        "--disable-extensions",
+    ):
+        options.add_argument(argument)
 
     with webdriver.Chrome(options=options) as driver:
         driver.delete_all_cookies()
-        wait = WebDriverWait(driver, 180, 1, (JavascriptException, StopIteration))
-        for _ in range(60):
-            try:
+        wait = WebDriverWait(driver, 180, 0.25, (JavascriptException, StopIteration))
+        # The ingress can take a while to route to dex after the relations are added
+        for attempt in retry_driver_get:
+            with attempt:
                 driver.get(public_url)
-                break
-            except WebDriverException:
-                sleep(5)
-        else:
-            driver.get(public_url)
 
         yield driver, wait, public_url
 
@@ -265,9 +267,10 @@ async def test_logging(ops_test):
     await assert_logging(app)
 
 
-# Helper to retry calling a function over 30 seconds or 5 attempts
-retry_for_5_attempts = Retrying(
-    stop=(stop_after_attempt(5) | stop_after_delay(30)),
-    wait=wait_exponential(multiplier=1, min=5, max=10),
+# Helper to retry loading a page while it is unreachable, backing off for up to 2 minutes
+retry_driver_get = Retrying(
+    retry=retry_if_exception_type(WebDriverException),
+    stop=stop_after_delay(120),
+    wait=wait_exponential(multiplier=1, min=1, max=30),
     reraise=True,
 )
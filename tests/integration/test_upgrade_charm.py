@@ -7,18 +7,19 @@ import pytest
 
 log = logging.getLogger(__name__)
 
+APP_NAME = "dex-auth-operator"
+
 
 @pytest.mark.abort_on_fail
 async def test_build_and_deploy(ops_test):
     local_charm = await ops_test.build_charm(".")
-    await ops_test.model.deploy("ch:dex-auth", "dex-auth-operator", trust=True)
-    await ops_test.model.wait_for_idle(status="active")
+    await ops_test.model.deploy("ch:dex-auth", APP_NAME, trust=True)
+    await ops_test.model.wait_for_idle(apps=[APP_NAME], status="active")
 
-    await ops_test.juju("upgrade-charm", "dex-auth-operator", "--path", local_charm)
-    await ops_test.model.wait_for_idle(status="active")
+    await ops_test.juju("upgrade-charm", APP_NAME, "--path", local_charm)
+    await ops_test.model.wait_for_idle(apps=[APP_NAME], status="active")
 
 
 async def test_status(ops_test):
-    for app in ops_test.model.applications.values():
-        for unit in app.units:
-            assert unit.workload_status == "active"
+    for unit in ops_test.model.applications[APP_NAME].units:
+        assert unit.workload_status == "active"
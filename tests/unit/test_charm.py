@@ -1,8 +1,10 @@
 # Copyright 2023 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+from hashlib import blake2b
 from unittest.mock import patch
 
+import bcrypt
 import pytest
 import yaml
 from charmed_kubeflow_chisme.exceptions import ErrorWithStatus
@@ -131,6 +133,207 @@ def test_generate_dex_auth_config_returns(update_layer, dex_config, harness):
         assert harness.model.config["static-username"] == static_passwords[0].get("username")
 
 
+@patch("charm.KubernetesServicePatch", lambda *_, **__: None)
+def test_ensure_state_keeps_stored_values(harness):
+    """Check the stored password and user id are generated only once."""
+    harness.begin()
+    harness.charm.ensure_state()
+    stored_state = (harness.charm.state.password, harness.charm.state.user_id)
+
+    with patch("charm.token_urlsafe") as token_urlsafe, patch("charm.uuid4") as uuid4:
+        harness.charm.ensure_state()
+    token_urlsafe.assert_not_called()
+    uuid4.assert_not_called()
+    assert (harness.charm.state.password, harness.charm.state.user_id) == stored_state
+
+
+@patch("charm.KubernetesServicePatch", lambda *_, **__: None)
+def test_ensure_salt_keeps_stored_salt(harness):
+    """Check the salt is generated only once while bcrypt-cost does not change."""
+    harness.begin()
+    harness.charm._ensure_salt()
+    salt = harness.charm.state.salt
+    assert salt.startswith(b"$2b$10$")
+
+    with patch("charm.bcrypt.gensalt") as gensalt:
+        harness.charm._ensure_salt()
+    gensalt.assert_not_called()
+    assert harness.charm.state.salt == salt
+
+
+@patch("charm.KubernetesServicePatch", lambda *_, **__: None)
+def test_ensure_salt_bcrypt_cost_changed(harness):
+    """Check a new salt with the configured cost is generated when bcrypt-cost changes."""
+    harness.begin()
+    harness.charm._ensure_salt()
+    assert harness.charm.state.salt.startswith(b"$2b$10$")
+
+    harness.update_config({"bcrypt-cost": 11})
+    harness.charm._ensure_salt()
+    assert harness.charm.state.salt.startswith(b"$2b$11$")
+
+
+@patch("charm.KubernetesServicePatch", lambda *_, **__: None)
+def test_ensure_salt_upgrade_keeps_salt(harness):
+    """Check a salt stored before the bcrypt-cost option existed survives the upgrade."""
+    harness.begin()
+    # State of a deployment from before the option, with a cost 12 salt
+    ensure_state(harness.charm)
+    salt = harness.charm.state.salt
+
+    harness.charm._ensure_salt()
+    assert harness.charm.state.salt == salt
+
+    # Changing the option afterwards generates a new salt with the configured cost
+    harness.update_config({"bcrypt-cost": 11})
+    harness.charm._ensure_salt()
+    assert harness.charm.state.salt.startswith(b"$2b$11$")
+
+
+@pytest.mark.parametrize("bcrypt_cost", (3, 16))
+@patch("charm.KubernetesServicePatch", lambda *_, **__: None)
+def test_ensure_salt_bcrypt_cost_out_of_range(bcrypt_cost, harness):
+    """Check the method raises when bcrypt-cost is out of range."""
+    harness.update_config({"bcrypt-cost": bcrypt_cost})
+    harness.begin()
+
+    with pytest.raises(ErrorWithStatus) as error:
+        harness.charm._ensure_salt()
+    assert error.value.msg == "bcrypt-cost must be between 4 and 15"
+    assert error.value.status_type == BlockedStatus
+
+
+@patch("charm.KubernetesServicePatch", lambda *_, **__: None)
+@patch.object(Operator, "ensure_state", ensure_state)
+def test_bcrypt_cost_ignored_without_password_db(harness):
+    """Check an out of range bcrypt-cost does not block when the password DB is disabled."""
+    harness.update_config(
+        {
+            "bcrypt-cost": 3,
+            "enable-password-db": False,
+            "connectors": "- type: github\n  id: github\n  name: GitHub",
+        }
+    )
+    harness.begin()
+    harness.charm.ensure_state()
+
+    dex_auth_config = yaml.safe_load(harness.charm._generate_dex_auth_config())
+    assert dex_auth_config["staticPasswords"] == []
+
+
+@patch("charm.KubernetesServicePatch", lambda *_, **__: None)
+@patch.object(Operator, "ensure_state", ensure_state)
+def test_hash_password_reuses_stored_hash(harness):
+    """Check bcrypt only runs again when the password changes."""
+    harness.begin()
+    harness.charm.ensure_state()
+
+    with patch("charm.bcrypt.hashpw", wraps=bcrypt.hashpw) as hashpw:
+        first_hash = harness.charm._hash_password(b"test-password")
+        assert harness.charm._hash_password(b"test-password") == first_hash
+        hashpw.assert_called_once()
+
+        new_hash = harness.charm._hash_password(b"new-password")
+        assert hashpw.call_count == 2
+
+    assert bcrypt.checkpw(b"test-password", first_hash.encode("utf-8"))
+    assert bcrypt.checkpw(b"new-password", new_hash.encode("utf-8"))
+
+
+@patch("charm.KubernetesServicePatch", lambda *_, **__: None)
+@patch.object(Operator, "ensure_state", ensure_state)
+def test_generate_dex_auth_config_sorts_static_clients(harness):
+    """Check the static clients are rendered in the same order regardless of relation order."""
+    harness.begin()
+    harness.charm.ensure_state()
+
+    clients = {
+        ("relation-1", "app-b"): {"id": "b", "name": "b", "redirectURIs": [], "secret": "b"},
+        ("relation-0", "app-a"): {"id": "a", "name": "a", "redirectURIs": [], "secret": "a"},
+    }
+    with patch.object(Operator, "_get_interface") as get_interface:
+        get_interface.return_value.get_data.return_value = clients
+        test_configuration = harness.charm._generate_dex_auth_config()
+
+    static_clients = yaml.safe_load(test_configuration)["staticClients"]
+    assert [client["id"] for client in static_clients] == ["a", "b"]
+
+
+@patch("charm.KubernetesServicePatch", lambda *_, **__: None)
+@patch.object(Operator, "ensure_state", ensure_state)
+def test_update_layer_only_when_changed(harness):
+    """Check the dex config is only pushed and dex restarted when the config or layer change."""
+    harness.set_leader(True)
+    harness.begin()
+    harness.set_can_connect("dex", True)
+    harness.charm.ensure_state()
+    container = harness.charm._container
+
+    with patch.object(container, "push", wraps=container.push) as push, patch.object(
+        container, "pull", wraps=container.pull
+    ) as pull, patch.object(container, "restart", wraps=container.restart) as restart:
+        # First update adds the layer, pushes the config and restarts dex
+        harness.charm._update_layer()
+        push.assert_called_once()
+        restart.assert_called_once()
+
+        # Nothing changed, so the config is not pushed again and dex is not restarted
+        push.reset_mock()
+        restart.reset_mock()
+        harness.charm._update_layer()
+        push.assert_not_called()
+        restart.assert_not_called()
+        assert container.get_service("dex").is_running()
+
+        # The config changed, so it is pushed by the config-changed handler
+        harness.update_config({"port": 5555})
+        push.assert_called_once()
+        restart.assert_called_once()
+
+    pull.assert_not_called()
+    assert "0.0.0.0:5555" in container.pull(harness.charm._dex_config_path).read()
+
+
+@patch("charm.KubernetesServicePatch", lambda *_, **__: None)
+@patch.object(Operator, "ensure_state", ensure_state)
+def test_update_layer_new_container_same_config(harness):
+    """Check a new container gets the config and dex is started without a restart."""
+    harness.set_leader(True)
+    harness.begin()
+    harness.set_can_connect("dex", True)
+    harness.charm.ensure_state()
+    container = harness.charm._container
+
+    # The config was already pushed to a previous container
+    dex_auth_config = harness.charm._generate_dex_auth_config().encode("utf-8")
+    harness.charm.state.config_hash = blake2b(dex_auth_config, digest_size=16).hexdigest()
+
+    with patch.object(container, "restart") as restart:
+        harness.charm._update_layer()
+    restart.assert_not_called()
+    assert container.pull(harness.charm._dex_config_path).read() == dex_auth_config.decode()
+    assert container.get_service("dex").is_running()
+
+
+@patch("charm.KubernetesServicePatch", lambda *_, **__: None)
+@patch.object(Operator, "ensure_state", ensure_state)
+def test_update_layer_starts_stopped_service(harness):
+    """Check dex is started when nothing changed but the service is not running."""
+    harness.set_leader(True)
+    harness.begin()
+    harness.set_can_connect("dex", True)
+    harness.charm.ensure_state()
+    container = harness.charm._container
+
+    harness.charm._update_layer()
+    container.stop("dex")
+
+    with patch.object(container, "restart") as restart:
+        harness.charm._update_layer()
+    restart.assert_not_called()
+    assert container.get_service("dex").is_running()
+
+
 @patch("charm.KubernetesServicePatch", lambda *_, **__: None)
 def test_disable_static_login_no_connector_blocked_status(harness):
     harness.set_leader(True)
@@ -153,6 +356,7 @@ def test_config_changed(update, harness):
     harness.begin()
 
     config_updates = {
+        "bcrypt-cost": 11,
         "enable-password-db": False,
         "issuer-url": "http://my-dex.io/dex",
         "port": 5555,
@@ -291,6 +495,24 @@ def test_issuer_url_property_with_issuer_url_config(
     assert harness.charm._issuer_url == expected_result
 
 
+@patch("charm.KubernetesServicePatch", lambda *_, **__: None)
+def test_issuer_url_property_cached(harness):
+    """Test the issuer URL is computed once per charm instance."""
+    harness.begin()
+    assert harness.charm._issuer_url == (
+        f"http://{harness.model.app.name}.{harness.model.name}.svc:5556/dex"
+    )
+
+    # Juju builds a new charm instance for every dispatch, the Harness reuses it
+    harness.update_config({"issuer-url": "http://my-dex.io/dex"})
+    assert harness.charm._issuer_url == (
+        f"http://{harness.model.app.name}.{harness.model.name}.svc:5556/dex"
+    )
+
+    harness.charm.__dict__.pop("_issuer_url")
+    assert harness.charm._issuer_url == "http://my-dex.io/dex"
+
+
 @patch("charm.KubernetesServicePatch", lambda *_, **__: None)
 @pytest.mark.parametrize(
     "public_url_config, expected_result",
@@ -2,6 +2,10 @@
 # Copyright 2024 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import copy
+import pickle
+from unittest.mock import patch
+
 import pytest
 from charms.dex_auth.v0.dex_oidc_config import (
     DexOidcConfigObject,
@@ -13,7 +17,7 @@ from charms.dex_auth.v0.dex_oidc_config import (
     DexOidcConfigRequirerWrapper,
     DexOidcConfigUpdatedEvent,
 )
-from charms.harness_extensions.v0.capture_events import capture
+from charms.harness_extensions.v0.capture_events import capture, capture_events
 from ops.charm import CharmBase
 from ops.model import TooManyRelatedAppsError
 from ops.testing import Harness
@@ -71,6 +75,16 @@ def test_requirer_get_data_from_requirer(requirer_charm_harness):
     assert actual_relation_data == expected_data
 
 
+@pytest.mark.parametrize(
+    "copy_object",
+    (copy.copy, copy.deepcopy, lambda obj: pickle.loads(pickle.dumps(obj))),
+)
+def test_dex_oidc_config_object_copy(copy_object):
+    """Test the DexOidcConfigObject can be copied and pickled."""
+    dex_oidc_config = DexOidcConfigObject(issuer_url="http://my-dex.io/dex")
+    assert copy_object(dex_oidc_config) == dex_oidc_config
+
+
 def test_get_dex_oidc_config_on_refresh_events(requirer_charm_harness):
     """Test the Provider correctly handles the event set in refresh_events."""
     # Initial configuration
@@ -85,10 +99,8 @@ def test_get_dex_oidc_config_on_refresh_events(requirer_charm_harness):
         refresh_events=[requirer_charm_harness.charm.on[TEST_RELATION_NAME].relation_joined],
     )
 
-    # Add and update relation
-    expected_data = DexOidcConfigObject(issuer_url="http://my-dex.io/dex")
-    data_dict = {"issuer_url": expected_data.issuer_url}
-    rel_id = requirer_charm_harness.add_relation(TEST_RELATION_NAME, "app", app_data=data_dict)
+    # Add relation, no data is set so no event is emitted by the harness for it
+    rel_id = requirer_charm_harness.add_relation(TEST_RELATION_NAME, "app")
     relation = requirer_charm_harness.charm.framework.model.get_relation(
         TEST_RELATION_NAME, rel_id
     )
@@ -146,7 +158,27 @@ def test_validate_relation_raise_no_relation_data(requirer_charm_harness):
 
     with pytest.raises(DexOidcConfigRelationDataMissingError) as error:
         requirer_charm_harness.charm._dex_oidc_config_requirer.get_data()
-    assert str(error.value) == f"No data found in relation {TEST_RELATION_NAME} data bag."
+    assert str(error.value) == f"Missing issuer-url in relation {TEST_RELATION_NAME} data bag."
+
+
+def test_validate_relation_raise_missing_issuer_url(requirer_charm_harness):
+    """Assert that DexOidcConfigRelationDataMissingError is raised if issuer-url is missing."""
+    requirer_charm_harness.set_model_name("test-model")
+    requirer_charm_harness.begin()
+    requirer_charm_harness.set_leader(True)
+
+    # Instantiate DexOidcConfigRequirerWrapper class
+    requirer_charm_harness.charm._dex_oidc_config_requirer = DexOidcConfigRequirerWrapper(
+        requirer_charm_harness.charm, relation_name=TEST_RELATION_NAME
+    )
+
+    requirer_charm_harness.add_relation(
+        TEST_RELATION_NAME, "app", app_data={"other-key": "other-value"}
+    )
+
+    with pytest.raises(DexOidcConfigRelationDataMissingError) as error:
+        requirer_charm_harness.charm._dex_oidc_config_requirer.get_data()
+    assert str(error.value) == f"Missing issuer-url in relation {TEST_RELATION_NAME} data bag."
 
 
 def test_provider_sends_data_automatically_passes(provider_charm_harness):
@@ -222,3 +254,145 @@ def test_provider_wrapper_send_data_passes(provider_charm_harness):
         actual_relation_data = relation.data[provider_charm_harness.charm.app]
         # Assert returns dictionary with expected values
         assert actual_relation_data.get("issuer-url") == relation_data.issuer_url
+
+
+def test_requirer_wrapper_get_data_reuses_object(requirer_charm_harness):
+    """Assert the same object is returned until the relation data changes."""
+    # Initial configuration
+    requirer_charm_harness.set_model_name("test-model")
+    requirer_charm_harness.set_leader(True)
+    requirer_charm_harness.begin()
+
+    # Add and update relation
+    rel_id = requirer_charm_harness.add_relation(
+        TEST_RELATION_NAME, "app", app_data={"issuer-url": "http://my-dex.io/dex"}
+    )
+
+    # Instantiate DexOidcConfigRequirerWrapper class
+    requirer_wrapper = DexOidcConfigRequirerWrapper(
+        requirer_charm_harness.charm, relation_name=TEST_RELATION_NAME
+    )
+
+    first_data = requirer_wrapper.get_data()
+    assert requirer_wrapper.get_data() is first_data
+
+    # Update the relation data and check a new object is returned
+    requirer_charm_harness.update_relation_data(
+        rel_id, "app", {"issuer-url": "http://other-dex.io/dex"}
+    )
+    new_data = requirer_wrapper.get_data()
+    assert new_data is not first_data
+    assert new_data == DexOidcConfigObject(issuer_url="http://other-dex.io/dex")
+
+
+def test_provider_wrapper_send_data_skips_unchanged_data(provider_charm_harness):
+    """Assert the provider wrapper does not rewrite relation data that is up to date."""
+    # Initial configuration
+    issuer_url = "http://my-dex.io/dex"
+    provider_charm_harness.set_model_name("test-model")
+    provider_charm_harness.begin()
+    provider_charm_harness.set_leader(True)
+    rel_id = provider_charm_harness.add_relation(TEST_RELATION_NAME, "app")
+    provider_charm_harness.update_relation_data(
+        rel_id, provider_charm_harness.charm.app.name, {"issuer-url": issuer_url}
+    )
+
+    # Instantiate DexOidcConfigProviderWrapper class
+    provider_wrapper = DexOidcConfigProviderWrapper(
+        provider_charm_harness.charm,
+        relation_name=TEST_RELATION_NAME,
+    )
+
+    # Send the same relation data and check nothing was written
+    with patch.object(
+        provider_charm_harness._backend,
+        "update_relation_data",
+        wraps=provider_charm_harness._backend.update_relation_data,
+    ) as update_relation_data:
+        provider_wrapper.send_data(issuer_url=issuer_url)
+    update_relation_data.assert_not_called()
+
+
+def test_provider_wrapper_send_data_not_leader(provider_charm_harness):
+    """Assert the provider wrapper does not write relation data when not the leader."""
+    # Initial configuration
+    provider_charm_harness.set_model_name("test-model")
+    provider_charm_harness.begin()
+    provider_charm_harness.set_leader(False)
+    rel_id = provider_charm_harness.add_relation(TEST_RELATION_NAME, "app")
+
+    # Instantiate DexOidcConfigProviderWrapper class
+    provider_wrapper = DexOidcConfigProviderWrapper(
+        provider_charm_harness.charm,
+        relation_name=TEST_RELATION_NAME,
+    )
+
+    # Send relation data and check nothing was written
+    with patch.object(
+        provider_charm_harness._backend,
+        "update_relation_data",
+        wraps=provider_charm_harness._backend.update_relation_data,
+    ) as update_relation_data:
+        provider_wrapper.send_data(issuer_url="http://my-dex.io/dex")
+    update_relation_data.assert_not_called()
+    assert provider_charm_harness.get_relation_data(rel_id, provider_charm_harness.charm.app) == {}
+
+
+@pytest.mark.parametrize(
+    "refresh_events",
+    (
+        lambda charm: charm.on.config_changed,
+        lambda charm: [charm.on.config_changed, charm.on.config_changed],
+    ),
+)
+def test_provider_refresh_events_observed_once(refresh_events, provider_charm_harness):
+    """Assert each refresh event sends the data once, even if passed more than once."""
+    provider_charm_harness.set_model_name("test-model")
+    provider_charm_harness.set_leader(True)
+    provider_charm_harness.begin()
+
+    # Instantiate the DexOidcConfigProvider
+    provider_charm_harness.charm._dex_oidc_config_provider = DexOidcConfigProvider(
+        charm=provider_charm_harness.charm,
+        issuer_url="http://my-dex.io/dex",
+        refresh_events=refresh_events(provider_charm_harness.charm),
+        relation_name=TEST_RELATION_NAME,
+    )
+
+    with patch.object(DexOidcConfigProviderWrapper, "send_data") as send_data:
+        provider_charm_harness.charm.on.config_changed.emit()
+    send_data.assert_called_once_with("http://my-dex.io/dex")
+
+
+def test_requirer_emits_updated_once_for_same_data(requirer_charm_harness):
+    """Test the Requirer emits a single updated event while the data does not change."""
+    # Initial configuration
+    requirer_charm_harness.set_model_name("test-model")
+    requirer_charm_harness.set_leader(True)
+    requirer_charm_harness.begin()
+
+    # Instantiate DexOidcConfigRequirer class
+    requirer_charm_harness.charm._dex_oidc_config_requirer = DexOidcConfigRequirer(
+        requirer_charm_harness.charm,
+        relation_name=TEST_RELATION_NAME,
+        refresh_events=[requirer_charm_harness.charm.on[TEST_RELATION_NAME].relation_joined],
+    )
+
+    # Add relation, the harness emits the relation events for the data
+    data_dict = {"issuer-url": "http://my-dex.io/dex"}
+    rel_id = requirer_charm_harness.add_relation(TEST_RELATION_NAME, "app", app_data=data_dict)
+    relation = requirer_charm_harness.charm.framework.model.get_relation(
+        TEST_RELATION_NAME, rel_id
+    )
+
+    # Assert that no more events are emitted for the same data
+    with capture_events(requirer_charm_harness.charm, DexOidcConfigUpdatedEvent) as captured:
+        requirer_charm_harness.charm.on[TEST_RELATION_NAME].relation_joined.emit(relation)
+        requirer_charm_harness.charm.on[TEST_RELATION_NAME].relation_changed.emit(relation)
+    assert not captured
+
+    # Assert that a new event is emitted once the data changes
+    with capture(requirer_charm_harness.charm, DexOidcConfigUpdatedEvent):
+        requirer_charm_harness.update_relation_data(
+            rel_id, "app", {"issuer-url": "http://other-dex.io/dex"}
+        )